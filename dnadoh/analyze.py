@@ -11,9 +11,14 @@ import os
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
-from dash import Dash, dcc, html, Input, Output
+from dash import Dash, dcc, html, Input, Output, State
 from scipy import stats
-from dnadoh_plot.plot_util import plot_boxplot
+from dnadoh_plot.plot_util import (
+    boxplot_summary,
+    phenotype_table,
+    plot_boxplot_prepared,
+    prepare_boxplot_data,
+)
 
 from assemble import assemble
 
@@ -25,8 +30,9 @@ def get_unique_locations(df: pd.DataFrame) -> list:
     return df["location"].drop_duplicates().dropna().to_list()
 
 
-def _get_pids(df: pd.DataFrame) -> set:
-    return set(df["pid"].drop_duplicates().to_list())
+def _get_pids(df: pd.DataFrame):
+    """Unique pids as an array (no Python-level list/set round-trip)."""
+    return df["pid"].unique()
 
 
 def main():
@@ -36,6 +42,18 @@ def main():
     locations = get_unique_locations(assembled_df)
     locations = sorted(locations)
 
+    # for a fixed dataset the statistics are a pure function of location,
+    # so summarize every location once at startup; the browser patches the
+    # existing figure from these numbers without a server round-trip
+    pheno = phenotype_table(assembled_df)
+    summaries = {}
+    initial_figure = None
+    for loc in locations:
+        subset_df, ref_pheno, reference = prepare_boxplot_data(assembled_df, loc, pheno)
+        summaries[str(int(loc))] = boxplot_summary(subset_df, ref_pheno, "weight", reference)
+        if initial_figure is None:
+            initial_figure = plot_boxplot_prepared(subset_df, ref_pheno, "weight", reference)
+
     app = Dash(__name__)
 
     app.layout = html.Div(
@@ -54,18 +72,62 @@ def main():
                         style={"width": "10%", "margin-left": "100px", "margin-bottom": "0px", "margin-top": "50px", "display": "inline-block"},
                     ),
                     html.Div(
-                        [dcc.Graph(id="variant")],
+                        [dcc.Graph(id="variant", figure=initial_figure)],
                         style={"width": "75%"}
                     )
                 ]
             ),
+            # per-location box statistics, shipped to the client once
+            dcc.Store(id="stats-store", data=summaries),
         ]
     )
 
-    @app.callback(Output("variant", "figure"), Input("variant-select", "value"))
-    def update_graph(location):
-        fig = plot_boxplot(assembled_df, "weight", location)
-        return fig
+    # patch the box and table traces in the browser: only the trace
+    # fields change per location, so no figure is rebuilt server-side
+    app.clientside_callback(
+        """
+        function(location, stats, baseFig) {
+            if (location === null || location === undefined) {
+                return window.dash_clientside.no_update;
+            }
+            const summary = stats[String(Math.round(location))];
+            const fig = JSON.parse(JSON.stringify(baseFig));
+            summary.boxes.forEach(function(box, i) {
+                const trace = fig.data[i];
+                trace.name = box.name;
+                if ("q1" in box) {
+                    trace.q1 = [box.q1];
+                    trace.median = [box.median];
+                    trace.q3 = [box.q3];
+                    trace.lowerfence = [box.lowerfence];
+                    trace.upperfence = [box.upperfence];
+                    trace.mean = [box.mean];
+                    trace.sd = [box.sd];
+                    trace.y = [box.outliers];
+                } else {
+                    // no carriers here: clear any stats left over from
+                    // the previously rendered location, otherwise plotly
+                    // still draws a box from them
+                    delete trace.q1;
+                    delete trace.median;
+                    delete trace.q3;
+                    delete trace.lowerfence;
+                    delete trace.upperfence;
+                    delete trace.mean;
+                    delete trace.sd;
+                    trace.y = [];
+                }
+            });
+            const table = fig.data[fig.data.length - 1];
+            table.cells.values = [summary.table["base"], summary.table["p-value"]];
+            return fig;
+        }
+        """,
+        Output("variant", "figure"),
+        Input("variant-select", "value"),
+        State("stats-store", "data"),
+        State("variant", "figure"),
+    )
 
     app.run_server(debug=True)
 
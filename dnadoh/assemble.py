@@ -2,14 +2,40 @@
 
 import csv
 import json
+import os
 import sys
 import util
 import argparse
 
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 import pandas as pd
 import util
 
-from sklearn.utils import shuffle
+# numba is optional: very large variant sets benefit from the compiled
+# parallel gather, everything else falls back to plain numpy
+try:
+    from numba import njit, prange
+
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
+# fixed dtype for the base columns: every dataset gets the same category
+# order, so the underlying int8 codes (A=0, C=1, G=2, T=3) are stable
+# and numeric consumers can work on .cat.codes directly
+BASE_DTYPE = pd.CategoricalDtype(list("ACGT"))
+
+if HAVE_NUMBA:
+
+    @njit(parallel=True, cache=True)
+    def _gather_reference(locations, genome):
+        """Collect the reference base for each 1-based variant location."""
+        out = np.empty(locations.size, dtype=np.uint8)
+        for i in prange(locations.size):
+            out[i] = genome[locations[i] - 1]
+        return out
 
 
 def read_combined(options):
@@ -20,9 +46,19 @@ def read_combined(options):
 
     variants = _read_genomes(stem, phenotypes)
     variants = variants.rename(columns={"base": "alternate"})
-    variants["reference"] = variants.apply(
-        lambda x: reference["genome"][x["location"] - 1], axis=1
-    )
+    # look up all reference bases in one vectorized gather instead of
+    # calling a Python lambda once per row
+    genome_arr = np.frombuffer(reference["genome"].encode("ascii"), dtype=np.uint8)
+    locations = variants["location"].to_numpy(dtype=np.int64)
+    if HAVE_NUMBA:
+        ref_codes = _gather_reference(locations, genome_arr)
+    else:
+        ref_codes = genome_arr[locations - 1]
+    variants["reference"] = ref_codes.view("S1").astype("U1")
+    # keep the base columns categorical: single-letter categories are far
+    # smaller than per-row strings and make downstream groupbys cheaper
+    variants["reference"] = variants["reference"].astype(BASE_DTYPE)
+    variants["alternate"] = variants["alternate"].astype(BASE_DTYPE)
     # re-arrange columns as convention is for reference to come before alternate
     new_cols = ["location", "reference", "alternate", "pid"]
     variants = variants[new_cols]
@@ -30,7 +66,20 @@ def read_combined(options):
     if options.isolate_households:
         phenotypes, variants = _isolate_households(phenotypes, variants, options)
 
-    combined = pd.merge(phenotypes, variants, on="pid", how="outer")
+    # join on the pid index: each pid appears once in phenotypes and many
+    # times in variants, so an index-aligned join skips the key hashing a
+    # from-scratch merge would redo
+    combined = (
+        phenotypes.set_index("pid")
+        .join(variants.set_index("pid"), how="outer")
+        .reset_index()
+    )
+    # stash the genome on the frame so downstream consumers (plots,
+    # notebooks) can reach it without re-reading the JSON; kept as a
+    # plain string so attrs stay comparable during concat and
+    # JSON-serializable when the frame is persisted
+    combined.attrs["genome"] = reference["genome"]
+    combined.attrs["mutation_locations"] = list(reference["locations"])
     return combined
 
 
@@ -43,30 +92,100 @@ def read_reference_genome(stem):
 
 def _read_genomes(stem, raw_phenotypes):
     """Read variant data and combine with reference to create genome."""
-    variants = None
-    genomes = []
-    for pid in raw_phenotypes["pid"]:
+    # newer datasets ship all variants as one long-form CSV; one parse
+    # replaces a file open per person
+    combined_file = util.filename_variants(stem)
+    if os.path.exists(combined_file):
+        return pd.read_csv(
+            combined_file,
+            engine="pyarrow",
+            dtype={"pid": "int32", "location": "int32", "base": BASE_DTYPE},
+        )
+
+    # older datasets: one variant file per person
+    # a person file holding only the header has no variants to contribute
+    # (the csv module wrote these with \r\n line endings)
+    header_bytes = len("location,base\r\n")
+
+    def _load_one(pid):
         filename = util.filename_person(stem, pid)
-        temp = pd.read_csv(filename)
+        # most of the population matches the reference; checking the file
+        # size skips a parser start-up per variant-free person — and a
+        # *missing* file still raises, since that means a broken dataset
+        if os.path.getsize(filename) <= header_bytes:
+            return None
+        temp = pd.read_csv(
+            filename,
+            engine="pyarrow",
+            dtype={"location": "int32", "base": BASE_DTYPE},
+        )
         temp["pid"] = pid
-        variants = temp if (variants is None) else pd.concat([variants, temp])
-    return variants
+        return temp
+
+    # read the per-person files on a thread pool so file I/O and CSV
+    # parsing (which releases the GIL) overlap, then concatenate once:
+    # concatenating inside the loop re-copies the growing frame each time
+    with ThreadPoolExecutor() as executor:
+        frames = [f for f in executor.map(_load_one, raw_phenotypes["pid"]) if f is not None]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
 
 
 def _read_phenotypes(stem):
     """Return raw phenotype data as list of dictionaries."""
     filename = util.filename_phenotypes(stem)
-    return pd.read_csv(filename)
+    return pd.read_csv(filename, engine="pyarrow", dtype={"pid": "int32"})
 
 def _isolate_households(phenotypes, variants, options):
-    phenotypes = shuffle(phenotypes, random_state = options.seed) # shuffling order prevents biasing which duplicate is retained
+    # shuffling order prevents biasing which duplicate is retained; a plain
+    # numpy permutation does this without pulling in sklearn
+    rng = np.random.default_rng(options.seed)
+    phenotypes = phenotypes.iloc[rng.permutation(len(phenotypes))]
     phenotypes = phenotypes.drop_duplicates(subset="household_id")
-    variants = variants[variants["pid"].isin(phenotypes["pid"])]
+    # inner merge on pid does one hash-join in C instead of building a
+    # boolean mask over the whole variants frame and gathering from it
+    variants = variants.merge(phenotypes[["pid"]], on="pid", how="inner")
     return phenotypes.sort_values("pid"), variants.sort_values("pid") # restore same ordering
 
+def read_assembled(stem):
+    """Load a previously assembled dataset from its Parquet form."""
+    return pd.read_parquet(util.filename_assembled_parquet(stem))
+
+
+def _input_mtime(stem):
+    """Latest modification time of the synthesized inputs for a stem.
+
+    The phenotype and reference files are written in the same pass as the
+    per-person files, so their timestamps stand in for the whole set.
+    """
+    return max(
+        os.path.getmtime(util.filename_phenotypes(stem)),
+        os.path.getmtime(util.filename_reference_genome(stem)),
+    )
+
+
 def assemble(options):
+    stem = options.input_stem
+    parquet_file = util.filename_assembled_parquet(stem)
+    assemble_options = {
+        "isolate_households": bool(options.isolate_households),
+        "seed": options.seed,
+    }
+
+    # reuse the persisted Parquet when the inputs haven't changed since it
+    # was written and it was assembled with the same options; restarting a
+    # dashboard then costs a columnar load instead of a full re-parse
+    if os.path.exists(parquet_file) and os.path.getmtime(parquet_file) >= _input_mtime(stem):
+        cached = read_assembled(stem)
+        if cached.attrs.get("assemble_options") == assemble_options:
+            return cached
+
     combined = read_combined(options)
+    combined.attrs["assemble_options"] = assemble_options
+    # Parquet is the primary on-disk form: it keeps the categorical and
+    # integer dtypes and loads far faster than re-parsing CSV; CSV stays
+    # available for external consumers via --write-csv
+    combined.to_parquet(parquet_file, compression="zstd", index=False)
     if options.write_csv:
-        filename = util.filename_assembled_data(options.input_stem)
+        filename = util.filename_assembled_data(stem)
         combined.to_csv(filename, index=False)
     return combined
\ No newline at end of file
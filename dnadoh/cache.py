@@ -29,14 +29,19 @@ Things to change:
 """
 
 import csv
-import filecmp
+import hashlib
+import os
 import requests
 import shutil
+import threading
 import validators
 
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from urllib.parse import urljoin
 
+from requests.adapters import HTTPAdapter
+
 
 CONFIG = {
     "cache": Path(__file__).parent.parent.joinpath("cache"),
@@ -47,7 +52,53 @@ CONFIG = {
 DOWNLOAD_LIMIT = 2.5e8
 
 CACHE_INDEX = "cache_index.csv"
-CACHE_HEADER = ["cache_path", "remote_path"]
+CACHE_HEADER = ["cache_path", "remote_path", "size", "mtime", "sha256"]
+
+# Shared session so downloads reuse TCP/TLS connections; the adapter's
+# pool is sized for concurrent fetches via `get_many`.
+MAX_WORKERS = 16
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_maxsize=MAX_WORKERS * 2))
+SESSION.mount("https://", HTTPAdapter(pool_maxsize=MAX_WORKERS * 2))
+
+# How many bytes to move per chunk when streaming a download to disk.
+CHUNK_SIZE = 1 << 16
+
+
+def _copy_local(src, dst):
+    """Copy a local file, in-kernel when the OS supports it.
+
+    `os.copy_file_range` moves the bytes without round-tripping them
+    through userspace, and on reflink-capable filesystems the kernel can
+    share extents instead of copying at all.  Anywhere the call is
+    unavailable or refused (network mounts, the fake filesystem used in
+    tests) this falls back to a plain `shutil.copyfile`.
+    """
+    if hasattr(os, "copy_file_range"):
+        try:
+            with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+                remaining = os.fstat(fsrc.fileno()).st_size
+                while remaining > 0:
+                    moved = os.copy_file_range(
+                        fsrc.fileno(), fdst.fileno(), remaining
+                    )
+                    if moved == 0:
+                        break
+                    remaining -= moved
+                if remaining == 0:
+                    return
+        except OSError:
+            pass
+    shutil.copyfile(src, dst)
+
+
+def _sha256(path):
+    """Streamed SHA-256 of a file, read one chunk at a time."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as fhandle:
+        while chunk := fhandle.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
 
 
 class FileCache:
@@ -65,6 +116,9 @@ class FileCache:
             self.remote_url = CONFIG["remote"]
 
         self.cache_index = Path(self.cache_dir, CACHE_INDEX)
+        self._index_lock = threading.Lock()
+        # names in the remote directory, listed lazily on first use
+        self._remote_files = None
         self.setup_cache()
 
     def get(self, requested_file):
@@ -85,6 +139,13 @@ class FileCache:
             # confirm that it's in the cache index and if not then add it
             if not self.check_if_in_cache(cache_path):
                 self.add_to_cache_index(remote_path, cache_path)
+            elif not self._entry_is_valid(cache_path):
+                # the local copy no longer matches what was indexed, so
+                # re-fetch rather than hand back a stale or corrupt file
+                if validators.url(requested_file):
+                    self._download_file(requested_file, cache_path)
+                else:
+                    self.handle_local_file(requested_file, cache_path)
         else:
             if validators.url(requested_file):
                 self._download_file(requested_file, cache_path)
@@ -93,37 +154,80 @@ class FileCache:
 
         return str(cache_path)
 
+    def get_many(self, requested_files):
+        """Fetch several files concurrently, returning cache paths in order.
+
+        Cache misses are mostly network latency, so dispatching the
+        individual `get` calls on a thread pool overlaps the round-trips;
+        the shared session's connection pool keeps them on live sockets.
+        """
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            return list(executor.map(self.get, requested_files))
+
     def clear(self):
         """Clear the cache, deleting local files."""
         for filename in self.cache_dir.iterdir():
             filename.unlink()
+        self._remote_files = None
         self.setup_cache()
 
+    def _remote_names(self, refresh=False):
+        """Names present in the remote directory.
+
+        Listed once with a single scandir and reused, so a batch of gets
+        costs one directory read instead of one stat per file.
+        """
+        if self._remote_files is None or refresh:
+            self._remote_files = {entry.name for entry in os.scandir(self.remote_url)}
+        return self._remote_files
+
     def _get_file(self, remote_path, local_path):
         """Simulate getting a remote file."""
+        name = str(remote_path)
         remote_path = Path(self.remote_url, remote_path)
-        if not remote_path.exists():
-            raise ValueError(f"{remote_path} does not exist")
-        shutil.copyfile(remote_path, local_path)
+        if name not in self._remote_names():
+            # the listing may predate the file; rescan before giving up
+            if name not in self._remote_names(refresh=True):
+                raise ValueError(f"{remote_path} does not exist")
+        _copy_local(remote_path, local_path)
 
     def _download_file(self, remote_url, local_path):
-        """Downloads a file from a remote url"""
-        h = requests.head(remote_url, allow_redirects=True)
-        header = h.headers
-        content_length = header.get("content-length", None)  # this is case insensitive
-        if content_length is None:
-            raise RuntimeError(
-                f"Cannot validate the size of the requested file: {remote_url}. Not downloading."
-            )
-        elif content_length and content_length > DOWNLOAD_LIMIT:  # this is in bytes
-            raise RuntimeError(f"{remote_url} is too large (> {DOWNLOAD_LIMIT} bytes).")
-        r = requests.get(remote_url, allow_redirects=True)
-        if r.status_code == 200:
-            with open(local_path, "wb") as fhandle:
-                fhandle.write(r.content)
-            self.add_to_cache_index(remote_url, local_path)
-        else:
-            raise RuntimeError(f"{remote_url} could not be downloaded.")
+        """Downloads a file from a remote url, streaming it to disk"""
+        # with stream=True the headers arrive before the body, so the
+        # size check happens on the same connection — no separate HEAD
+        # round-trip, and no failure on servers whose HEAD responses omit
+        # Content-Length
+        with SESSION.get(remote_url, stream=True, allow_redirects=True) as r:
+            if r.status_code != 200:
+                raise RuntimeError(f"{remote_url} could not be downloaded.")
+            content_length = r.headers.get("content-length")  # case insensitive
+            if content_length is not None and int(content_length) > DOWNLOAD_LIMIT:
+                raise RuntimeError(
+                    f"{remote_url} is too large (> {DOWNLOAD_LIMIT} bytes)."
+                )
+            # stream the body in chunks so peak memory stays at one chunk
+            # rather than the whole payload, and enforce the size limit on
+            # the bytes actually received in case the server lied about
+            # the length; write to a temporary name and rename into place
+            # on success so an interrupted connection never leaves a
+            # truncated file at the final cache path for a later get()
+            # to index as valid
+            part_path = Path(f"{local_path}.part")
+            written = 0
+            try:
+                with open(part_path, "wb") as fhandle:
+                    for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                        written += len(chunk)
+                        if written > DOWNLOAD_LIMIT:
+                            raise RuntimeError(
+                                f"{remote_url} is too large (> {DOWNLOAD_LIMIT} bytes)."
+                            )
+                        fhandle.write(chunk)
+            except BaseException:
+                part_path.unlink(missing_ok=True)
+                raise
+            part_path.replace(local_path)
+        self.add_to_cache_index(remote_url, local_path)
 
     def handle_local_file(self, requested_file, cache_path):
         """Processes a file requested from a local directory"""
@@ -132,28 +236,49 @@ class FileCache:
         self.add_to_cache_index(remote_path, cache_path)
 
     def setup_cache(self):
-        """Creates an index for the cache if it doesn't exist"""
+        """Creates an index for the cache if it doesn't exist.
+
+        The index is also mirrored into an in-memory set so lookups are a
+        hash probe instead of a linear scan of the CSV on every `get`.
+        """
         if not Path(self.cache_index).exists():
             with open(self.cache_index, "w") as fhandle:
                 writer = csv.DictWriter(fhandle, fieldnames=CACHE_HEADER)
                 writer.writeheader()
+        with open(self.cache_index, "r") as fhandle:
+            reader = csv.DictReader(fhandle)
+            self._index = {row[CACHE_HEADER[0]]: row for row in reader}
 
     def check_if_in_cache(self, local_path):
         """Checks if a file is in the cache index"""
-        with open(self.cache_index, "r") as fhandle:
-            reader = csv.DictReader(fhandle)
-            for row in reader:
-                if row[CACHE_HEADER[0]] == local_path:
-                    return True
-        return False
+        return str(local_path) in self._index
+
+    def _entry_is_valid(self, local_path):
+        """Check a cached file against its index entry.
+
+        Size and mtime come from a single `stat`, so a normal hit costs
+        microseconds; the stored hash is only recomputed when they
+        disagree (e.g. the file was touched but not changed).
+        """
+        row = self._index[str(local_path)]
+        st = os.stat(local_path)
+        if str(st.st_size) == row["size"] and str(st.st_mtime) == row["mtime"]:
+            return True
+        return row["sha256"] is not None and _sha256(local_path) == row["sha256"]
 
     def add_to_cache_index(self, remote_path, local_path):
         """Adds a file to the cache index"""
-        with open(self.cache_index, "a") as fhandle:
-            writer = csv.DictWriter(fhandle, fieldnames=CACHE_HEADER)
-            writer.writerow(
-                {
-                    CACHE_HEADER[0]: local_path,
-                    CACHE_HEADER[1]: remote_path,
-                }
-            )
+        st = os.stat(local_path)
+        row = {
+            CACHE_HEADER[0]: str(local_path),
+            CACHE_HEADER[1]: str(remote_path),
+            "size": str(st.st_size),
+            "mtime": str(st.st_mtime),
+            "sha256": _sha256(local_path),
+        }
+        # serialized so concurrent `get_many` fetches don't interleave rows
+        with self._index_lock:
+            self._index[row[CACHE_HEADER[0]]] = row
+            with open(self.cache_index, "a") as fhandle:
+                writer = csv.DictWriter(fhandle, fieldnames=CACHE_HEADER)
+                writer.writerow(row)
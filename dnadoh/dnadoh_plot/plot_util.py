@@ -1,31 +1,121 @@
 """Plotting utils"""
 
+import weakref
+
 import plotly.io as pio
 import plotly.express as px
 import plotly.graph_objects as go
 import pandas as pd
 import numpy as np
 from plotly.subplots import make_subplots
-from scipy import stats
+from scipy import special, stats
+
+from . import theme  # noqa: F401  (registers the shared figure template)
+
+# numba is optional: with it the manhattan t-tests run as one compiled
+# parallel pass over ragged group arrays, otherwise a batched SciPy call
+# over NaN-padded matrices does the same work
+try:
+    from numba import njit, prange
+
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
 
 # this file serves to keep all the plotting functionality in one place
 # the idea is to separate the figure creation process from the dash framework
 
+if HAVE_NUMBA:
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _group_moments(flat, offsets):
+        """Mean, sum of squared deviations and count per CSR-style group."""
+        n_groups = offsets.size - 1
+        means = np.empty(n_groups)
+        ssds = np.empty(n_groups)
+        counts = np.empty(n_groups)
+        for i in prange(n_groups):
+            start, stop = offsets[i], offsets[i + 1]
+            total = 0.0
+            for j in range(start, stop):
+                total += flat[j]
+            mean = total / (stop - start)
+            ssd = 0.0
+            for j in range(start, stop):
+                dev = flat[j] - mean
+                ssd += dev * dev
+            means[i] = mean
+            ssds[i] = ssd
+            counts[i] = stop - start
+        return means, ssds, counts
+
+
+def _flatten_groups(groups):
+    """Pack a list of ragged arrays into (flat values, offsets)."""
+    offsets = np.zeros(len(groups) + 1, dtype=np.int64)
+    np.cumsum([len(g) for g in groups], out=offsets[1:])
+    return np.concatenate(groups).astype(np.float64), offsets
+
+
+def _batched_ttest(alt_values, ref_values):
+    """Two-sample t-test p-values for paired lists of ragged groups."""
+    if HAVE_NUMBA:
+        # flat-array layout: no NaN padding, and the moment pass runs
+        # compiled and parallel; only the final t -> p step uses SciPy
+        alt_mean, alt_ssd, alt_n = _group_moments(*_flatten_groups(alt_values))
+        ref_mean, ref_ssd, ref_n = _group_moments(*_flatten_groups(ref_values))
+        df = alt_n + ref_n - 2
+        pooled_var = (alt_ssd + ref_ssd) / df
+        t = (alt_mean - ref_mean) / np.sqrt(pooled_var * (1 / alt_n + 1 / ref_n))
+        return 2 * special.stdtr(df, -np.abs(t))
+    alt_mat = np.full((len(alt_values), max(len(v) for v in alt_values)), np.nan)
+    ref_mat = np.full((len(ref_values), max(len(v) for v in ref_values)), np.nan)
+    for i, (a, r) in enumerate(zip(alt_values, ref_values)):
+        alt_mat[i, : len(a)] = a
+        ref_mat[i, : len(r)] = r
+    return stats.ttest_ind(alt_mat, ref_mat, axis=1, nan_policy='omit')[1]
+
+
+# 4x4 lookup of "R->A" labels, indexed by ref_code * 4 + alt_code so the
+# manhattan legend labels come from one C-level gather instead of per-row
+# string concatenation
+_REF_ALT_LABELS = np.array([f"{r}->{a}" for r in "ACGT" for a in "ACGT"])
+
 
 def get_unique_locations(df: pd.DataFrame) -> list:
     """Get unique locations with an alternate base"""
     return df["location"].drop_duplicates().dropna().to_list()
 
 
-def _get_pids(df: pd.DataFrame) -> set:
-    return set(df["pid"].drop_duplicates().to_list())
+def _get_pids(df: pd.DataFrame) -> np.ndarray:
+    """Unique pids as a NumPy array (no Python-level list/set round-trip)."""
+    return df["pid"].unique()
 
 
-def plot_boxplot(df: pd.DataFrame, y_variable: str, location: int) -> None:
+def phenotype_table(df: pd.DataFrame) -> pd.DataFrame:
+    """Deduplicated per-person phenotype columns, indexed by pid.
+
+    The assembled frame repeats each person's phenotypes once per
+    variant; computing this table once lets callers reuse it across
+    locations instead of re-deduplicating the whole frame.
     """
-    Creates boxplots of continuous variable 'y' on the y-axis
-    for each reference base.
+    return df[["pid", "age", "gsex", "weight"]].drop_duplicates().set_index("pid")
+
+
+def prepare_boxplot_data(
+    df: pd.DataFrame, location: int, pheno: pd.DataFrame = None
+) -> tuple:
+    """Build the per-location inputs used by the boxplot.
+
+    Returns the variant rows at `location`, the phenotype rows of the
+    individuals carrying the reference base there, and the reference
+    base itself.  Factored out of `plot_boxplot` so a caller (e.g. a
+    Dash app) can do this work once per location instead of on every
+    callback.
     """
+    if pheno is None:
+        pheno = phenotype_table(df)
+
     # subset dataframe to the location
     subset_df = df[df["location"] == location]
 
@@ -38,26 +128,112 @@ def plot_boxplot(df: pd.DataFrame, y_variable: str, location: int) -> None:
     ), f"There is more than one reference base at position f{location}!"
     reference = reference.pop()
 
-    # the subset will only contain individuals with an alternate base
-    # to include individuals with the reference base,
-    # we need to figure out who those are and add them back in
-    all_pids = _get_pids(df)
-    subset_pids = _get_pids(subset_df)
-    leftover_pids = all_pids.difference(subset_pids)
-
-    # build df of info for pids that have the reference base at this position
-    # drop duplicates due to joining of phenotypic + variant data
-    data = df[["pid", "age", "gsex", "weight"]].drop_duplicates()
-    data = data[data["pid"].isin(leftover_pids)]
-    data = data.assign(
-        location=[location] * len(data),
-        reference=[reference] * len(data),
-        alternate=["reference"] * len(data),
+    # the subset will only contain individuals with an alternate base;
+    # the individuals with the reference base are everyone else, found
+    # via a set-difference on the pid arrays
+    subset_pids = subset_df["pid"].unique()
+    leftover_pids = np.setdiff1d(
+        pheno.index.to_numpy(), subset_pids, assume_unique=True
     )
 
-    # concatenate to the df with the pids with the reference base to the 
-    # originally subset df so that we get one df with all pids
-    concat_df = pd.concat([subset_df, data], axis=0).sort_values(by=["pid"])
+    # gather their phenotypes straight from the pheno table: no
+    # fabricated rows, no concat, no sort
+    ref_pheno = pheno.loc[leftover_pids]
+    return subset_df, ref_pheno, reference
+
+
+def plot_boxplot(df: pd.DataFrame, y_variable: str, location: int) -> None:
+    """
+    Creates boxplots of continuous variable 'y' on the y-axis
+    for each reference base.
+    """
+    subset_df, ref_pheno, reference = prepare_boxplot_data(df, location)
+    return plot_boxplot_prepared(subset_df, ref_pheno, y_variable, reference)
+
+
+def boxplot_summary(
+    subset_df: pd.DataFrame, ref_pheno: pd.DataFrame, y_variable: str, reference: str
+) -> dict:
+    """Summarize a prepared per-location frame as JSON-ready box statistics.
+
+    Returns one entry per plotted base (the reference first) with the
+    quartiles, fences, mean/sd and outlier points, plus the t-test table
+    values.  Small enough to ship to a browser, so a client-side callback
+    can patch an existing figure without a server round-trip.
+    """
+    BASES = ["A", "C", "G", "T"]
+
+    bases = ["reference"] + [x for x in BASES if x != reference]
+
+    # partition the y values by base once instead of re-scanning
+    # `alternate` with a fresh boolean mask for every trace and t-test;
+    # the reference group's values come directly from the pheno table
+    grouped = {
+        base: values.to_numpy()
+        for base, values in subset_df.groupby(
+            "alternate", sort=False, observed=True
+        )[y_variable]
+    }
+    grouped["reference"] = ref_pheno[y_variable].to_numpy()
+    empty = np.array([])
+
+    boxes = []
+    for x in bases:
+        values = grouped.get(x, empty)
+        if len(values):
+            # O(1) numbers (plus outliers) per box instead of every raw point
+            q1, median, q3 = np.percentile(values, [25, 50, 75])
+            iqr = q3 - q1
+            lowerfence = q1 - 1.5 * iqr
+            upperfence = q3 + 1.5 * iqr
+            outliers = values[(values < lowerfence) | (values > upperfence)]
+            boxes.append(
+                {
+                    "name": x,
+                    "q1": q1,
+                    "median": median,
+                    "q3": q3,
+                    "lowerfence": lowerfence,
+                    "upperfence": upperfence,
+                    "mean": values.mean(),
+                    "sd": values.std(),
+                    "outliers": outliers.tolist(),
+                }
+            )
+        else:
+            boxes.append({"name": x, "outliers": []})
+
+    # t-test every alternate base against the reference in one batched
+    # call: pad the ragged alt arrays with NaN, stack them, and let
+    # scipy compute all the tests along axis 1
+    alt_bases = [x for x in bases if x != "reference"]
+    ref_values = grouped.get("reference", empty)
+    alt_values = [grouped.get(x, empty) for x in alt_bases]
+    max_len = max((len(v) for v in alt_values), default=0)
+    if max_len and len(ref_values):
+        stacked = np.full((len(alt_bases), max_len), np.nan)
+        for i, v in enumerate(alt_values):
+            stacked[i, : len(v)] = v
+        pvalues = stats.ttest_ind(
+            ref_values[None, :], stacked, axis=1, nan_policy="omit"
+        )[1]
+    else:
+        pvalues = np.full(len(alt_bases), np.nan)
+
+    return {
+        "boxes": boxes,
+        "table": {
+            "base": alt_bases,
+            "p-value": [round(p, 3) for p in np.atleast_1d(pvalues)],
+        },
+    }
+
+
+def plot_boxplot_prepared(
+    subset_df: pd.DataFrame, ref_pheno: pd.DataFrame, y_variable: str, reference: str
+) -> None:
+    """Build the boxplot figure from already-prepared per-location inputs."""
+    summary = boxplot_summary(subset_df, ref_pheno, y_variable, reference)
 
     fig = make_subplots(
         rows=1,
@@ -67,40 +243,32 @@ def plot_boxplot(df: pd.DataFrame, y_variable: str, location: int) -> None:
         horizontal_spacing=0.05,
     )
 
-    BASES = ["A", "C", "G", "T"]
-
-    bases = ["reference"] + [x for x in BASES if x != reference]
-
-    stats_df = {"base": [], "p-value": []}
-
-    for x in bases:
-        fig.add_trace(
-            go.Box(
-                y=concat_df[concat_df["alternate"] == x][y_variable],
-                name=x,
+    for entry in summary["boxes"]:
+        if "q1" in entry:
+            box = go.Box(
+                q1=[entry["q1"]],
+                median=[entry["median"]],
+                q3=[entry["q3"]],
+                lowerfence=[entry["lowerfence"]],
+                upperfence=[entry["upperfence"]],
+                mean=[entry["mean"]],
+                sd=[entry["sd"]],
+                y=[entry["outliers"]],
+                name=entry["name"],
                 boxpoints="outliers",
-            ),
-            row=1,
-            col=2,
-        )
-
-        # do a t-test with each base with reference
-        if x != "reference":
-            pvalue = stats.ttest_ind(
-                concat_df[concat_df["alternate"] == "reference"][y_variable],
-                concat_df[concat_df["alternate"] == x][y_variable],
-            )[1]
-
-            stats_df["base"].append(x)
-            stats_df["p-value"].append(round(pvalue, 3))
+            )
+        else:
+            box = go.Box(y=[], name=entry["name"], boxpoints="outliers")
+        fig.add_trace(box, row=1, col=2)
 
     fig.update_yaxes(title_text=y_variable, row=1, col=2)
     fig.update_xaxes(title_text="base", row=1, col=2)
 
+    table = summary["table"]
     fig.add_trace(
         go.Table(
             header=dict(values=["base", "p-value"]),
-            cells=dict(values=[stats_df[k] for k in stats_df.keys()]),
+            cells=dict(values=[table[k] for k in table.keys()]),
         ),
         row=1,
         col=1,
@@ -111,52 +279,107 @@ def plot_boxplot(df: pd.DataFrame, y_variable: str, location: int) -> None:
     return fig
 
 
+# Memoized manhattan statistics, keyed by (id(df), pheno_col).  A Dash
+# callback re-runs plot_manhattan on every dropdown change, so repeat
+# selections become a dict lookup plus a cheap figure render instead of
+# a full t-test pass.  Each entry holds a weakref to the frame so a
+# recycled id() can't serve stats computed for a dead frame.
+_MANHATTAN_STATS_CACHE = {}
+_MANHATTAN_STATS_MAXSIZE = 8
+
+
 def plot_manhattan(df: pd.DataFrame, pheno_col:str = "weight"):
     """Create a manhattanplot
     """
+    key = (id(df), pheno_col)
+    entry = _MANHATTAN_STATS_CACHE.get(key)
+    if entry is not None and entry[0]() is df:
+        results_df = entry[1]
+    else:
+        results_df = _manhattan_stats(df, pheno_col)
+        if len(_MANHATTAN_STATS_CACHE) >= _MANHATTAN_STATS_MAXSIZE:
+            _MANHATTAN_STATS_CACHE.pop(next(iter(_MANHATTAN_STATS_CACHE)))
+        _MANHATTAN_STATS_CACHE[key] = (weakref.ref(df), results_df)
+    return results_df, _manhattan_figure(results_df)
+
+
+def _manhattan_stats(df: pd.DataFrame, pheno_col: str) -> pd.DataFrame:
+    """Per-locus t-tests and effect sizes for the manhattan plot."""
 
     # Generating stats per position
-    all_loc = df[['location', 'reference', 'alternate']].drop_duplicates()
-
-    # Initializing results
-    results_df = []
-    for _, row in all_loc.iterrows():
-
-        # Subset data
-        subset_df = df[df['location'] == row['location']]
-        alt_df = subset_df.loc[
-            subset_df['alternate'] == row['alternate'],
-            ['pid', pheno_col]
-        ].drop_duplicates()
-        ref_df = df.loc[
-            ~df['pid'].isin(subset_df['pid']),
-            ['pid', pheno_col]
-        ].drop_duplicates()
+    all_loc = df[['location', 'reference', 'alternate']].drop_duplicates().dropna()
+
+    # Per-person phenotype values and per-group pid membership, computed
+    # once instead of re-filtering the whole frame for every locus
+    pid_pheno = df[['pid', pheno_col]].drop_duplicates().set_index('pid')[pheno_col]
+    all_pids = pid_pheno.index.to_numpy()
+    carriers_by_loc = df.groupby('location', observed=True)['pid'].unique().to_dict()
+    alt_pids = df.groupby(
+        ['location', 'alternate'], observed=True
+    )['pid'].unique().to_dict()
+
+    # Group means for the effect sizes, computed once in C: the alt mean
+    # per (location, alternate), and the per-locus reference mean derived
+    # from the population totals minus the carrier sums
+    alt_mean = df.groupby(['location', 'alternate'], observed=True)[pheno_col].mean()
+    loc_grouped = df.groupby('location', observed=True)[pheno_col]
+    ref_mean = (pid_pheno.sum() - loc_grouped.sum()) / (
+        len(pid_pheno) - loc_grouped.size()
+    )
+
+    # Gathering the alt/ref value arrays per locus as plain scalar/array
+    # columns; the t-tests run later as one batched call
+    locs, refs, alts = [], [], []
+    alt_values = []
+    ref_values = []
+    for row in all_loc.itertuples(index=False):
+        alt_vals = pid_pheno.loc[alt_pids[(row.location, row.alternate)]].to_numpy()
+        ref_vals = pid_pheno.loc[
+            np.setdiff1d(
+                all_pids, carriers_by_loc[row.location], assume_unique=True
+            )
+        ].to_numpy()
 
         # Checking for sufficient sample size
-        if alt_df.shape[0] <= 1 or ref_df.shape[0] <= 1:
+        if alt_vals.shape[0] <= 1 or ref_vals.shape[0] <= 1:
             continue
 
-        # Computing stats
-        effect_size = np.mean(ref_df[pheno_col]) / np.mean(alt_df[pheno_col])
-        p_value = stats.ttest_ind(
-            alt_df[pheno_col],
-            ref_df[pheno_col],
-        )[1]
-
-        # Adding stats to results
-        results_df.append({
-            'loc': row['location'],
-            'ref': row['reference'],
-            'alt': row['alternate'],
-            'effect_size': effect_size,
-            'p-value': p_value
+        locs.append(row.location)
+        refs.append(row.reference)
+        alts.append(row.alternate)
+        alt_values.append(alt_vals)
+        ref_values.append(ref_vals)
+
+    if locs:
+        # One batched t-test across all loci (compiled when numba is
+        # available, NaN-padded SciPy otherwise)
+        p_values = _batched_ttest(alt_values, ref_values)
+        effect_sizes = (
+            ref_mean.loc[locs].to_numpy()
+            / alt_mean.reindex(pd.MultiIndex.from_arrays([locs, alts])).to_numpy()
+        )
+        results_df = pd.DataFrame({
+            'loc': locs,
+            'ref': refs,
+            'alt': alts,
+            'effect_size': effect_sizes,
+            'p-value': np.atleast_1d(p_values),
         })
+    else:
+        results_df = pd.DataFrame(
+            columns=['loc', 'ref', 'alt', 'effect_size', 'p-value']
+        )
+    # skip the Series-boxing path for the log transform, and build the
+    # labels by indexing the lookup table with the base category codes
+    results_df['log10-p-value'] = -np.log10(results_df['p-value'].to_numpy())
+    ref_codes = pd.Categorical(results_df['ref'], categories=list("ACGT")).codes
+    alt_codes = pd.Categorical(results_df['alt'], categories=list("ACGT")).codes
+    results_df['ref_alt'] = _REF_ALT_LABELS[ref_codes * 4 + alt_codes]
+    return results_df
 
-    results_df = pd.DataFrame(results_df)
-    results_df['log10-p-value'] = -np.log10(results_df['p-value'])
-    results_df['ref_alt'] = results_df['ref'] + "->" + results_df['alt']
 
+def _manhattan_figure(results_df: pd.DataFrame):
+    """Render the manhattan scatter from an already-computed stats frame."""
     # Making a figure
     fig = px.scatter(
         results_df,
@@ -164,16 +387,9 @@ def plot_manhattan(df: pd.DataFrame, pheno_col:str = "weight"):
         y="log10-p-value",
         color="ref_alt",
         size='effect_size')
-    # fig.update_layout(legend_title_text='Ref -> Alt')
-    fig.update_xaxes(showline=True, linewidth=2, linecolor='black', mirror=True)
-    fig.update_yaxes(showline=True, linewidth=2, linecolor='black', mirror=True)
-    fig.update_xaxes(showgrid=True, gridwidth=1, gridcolor='grey')
-    fig.update_yaxes(showgrid=True, gridwidth=1, gridcolor='grey')
-    fig.update_layout({
-        'legend_title_text': 'Ref->Alt',
-        'plot_bgcolor': 'rgba(0,0,0,0)'
-    })
-    return results_df, fig
+    # axis lines, grid and background come from the shared template
+    fig.update_layout(legend_title_text='Ref->Alt')
+    return fig
     
 # TODO: add ecdf plotting functionality
 
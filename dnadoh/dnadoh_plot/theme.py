@@ -0,0 +1,31 @@
+"""Shared Plotly styling for DNA-doh figures.
+
+Registered once as a template so individual plot functions don't
+re-apply the same axis and background settings with per-figure
+`update_*` calls; the repeated style keys also stay out of every
+figure's JSON payload.
+"""
+
+import plotly.graph_objects as go
+import plotly.io as pio
+
+_AXIS_STYLE = dict(
+    showline=True,
+    linewidth=2,
+    linecolor="black",
+    mirror=True,
+    showgrid=True,
+    gridwidth=1,
+    gridcolor="grey",
+)
+
+pio.templates["dnadoh"] = go.layout.Template(
+    layout=dict(
+        xaxis=_AXIS_STYLE,
+        yaxis=_AXIS_STYLE,
+        plot_bgcolor="rgba(0,0,0,0)",
+    )
+)
+
+# layered on top of the standard theme so colorways etc. are kept
+pio.templates.default = "plotly+dnadoh"
@@ -2,28 +2,38 @@
 """
 
 import argparse
-from weakref import ref
-
-import pandas as pd
-import numpy as np
-
-# import plotly.graph_objects as go
-# from plotly.subplots import make_subplots
-import plotly.express as px
-
-from dash import Dash, dcc, html, Input, Output
-from scipy import stats
-
-from assemble import assemble
-from dnadoh_plot.plot_util import plot_manhattan
+import functools
 
 
 def main():
     """Generates a manhattan plot using plotly express and dash
     """
     options = parse_args()
+
+    # Plotly and Dash cost seconds of cold-import time, so they load
+    # after argument parsing rather than at module level: `--help` (and
+    # anything importing parse_args) never pays for them
+    from dash import Dash, dcc, html, Input, Output
+
+    from assemble import assemble
+    from dnadoh_plot.plot_util import plot_manhattan
     assembled_df = assemble(options)
-    _, fig = plot_manhattan(assembled_df)
+
+    # make sure the base columns are categorical before plot_manhattan
+    # groups on them: comparisons then run on small integer codes, not
+    # per-row strings (a no-op for freshly assembled data, which already
+    # arrives categorical)
+    for column in ("reference", "alternate"):
+        assembled_df[column] = assembled_df[column].astype("category")
+
+    # the dataset is fixed for the lifetime of the app, so the rendered
+    # figure is a pure function of the phenotype: cache it and serve
+    # dropdown re-selections without re-rendering anything
+    @functools.lru_cache(maxsize=None)
+    def figure_for(phenotype):
+        return plot_manhattan(df=assembled_df, pheno_col=phenotype)[1]
+
+    fig = figure_for("weight")
 
     app = Dash(__name__)
 
@@ -38,15 +48,15 @@ def main():
                 ),
             ]),
             dcc.Graph(
-                id='manhattan'
+                id='manhattan',
+                figure=fig
             ),
         ]
     )
 
     @app.callback(Output("manhattan", "figure"), Input("phenotype", "value"))
     def update_graph(phenotype):
-        _, fig = plot_manhattan(df=assembled_df, pheno_col=phenotype)
-        return fig
+        return figure_for(phenotype)
 
     app.run_server(debug=True)
 
@@ -55,7 +65,6 @@ def parse_args():
     """Parsing arguments
     """
     parser = argparse.ArgumentParser()
-    # nothing here for now
     parser.add_argument(
         "--input_stem",
         type=str,
@@ -63,6 +72,22 @@ def parse_args():
         help="Path/file stem of synthesized data",
         required=True,
     )
+    parser.add_argument(
+        "--isolate_households",
+        action="store_true",
+        help="enforce only one individual per household ID"
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="RNG seed"
+    )
+    parser.add_argument(
+        "--write-csv",
+        action="store_true",
+        help="write results to csv"
+    )
     options = parser.parse_args()
     return options
 
@@ -4,7 +4,54 @@ averaged with some noise.
 """
 
 from typing import List
-from synthesize import PersonGenerator, Person, _choose_one
+
+import numpy as np
+
+from synthesize import PersonGenerator, Person
+
+# numba is optional: the per-segment copy loop runs compiled when it is
+# available and falls back to a vectorized numpy merge otherwise
+try:
+    from numba import njit
+
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
+if HAVE_NUMBA:
+
+    @njit(cache=True)
+    def _copy_segments(g1, g2, loci, probs, draws, out):
+        """Copy each [loci[i], loci[i+1]) slice from g1 or g2 into out."""
+        for i in range(loci.size - 1):
+            start, stop = loci[i], loci[i + 1]
+            if draws[i] < probs[i]:
+                out[start:stop] = g1[start:stop]
+            else:
+                out[start:stop] = g2[start:stop]
+
+
+def _recombine_genome(genome1, genome2, ordered_loci, ordered_prob):
+    """Assemble the recombinant genome from pre-drawn segment choices.
+
+    Segment i spans [ordered_loci[i], ordered_loci[i+1]) and comes from
+    `genome1` with probability `ordered_prob[i]`.  All the random draws
+    happen in one call up front; the byte copies then run either in a
+    compiled numba loop or as a single vectorized merge.
+    """
+    g1 = np.frombuffer(genome1.encode("ascii"), dtype=np.uint8)
+    g2 = np.frombuffer(genome2.encode("ascii"), dtype=np.uint8)
+    loci = np.asarray(ordered_loci, dtype=np.int64)
+    probs = np.asarray(ordered_prob[:-1], dtype=np.float64)
+    draws = np.random.random(loci.size - 1)
+    if HAVE_NUMBA:
+        out = np.empty(g1.size, dtype=np.uint8)
+        _copy_segments(g1, g2, loci, probs, draws, out)
+    else:
+        from_g1 = np.repeat(draws < probs, np.diff(loci))
+        out = np.where(from_g1, g1, g2)
+    return out.tobytes().decode("ascii")
+
 
 def recombine(
     person1: Person,
@@ -27,11 +74,16 @@ def recombine(
     Returns:
         Person: A Person object whose genome is a recombination of those of person1 and person2
     """
-    # Error checking
-    assert len(recombination_loci) == len(recombination_prob)
+    # Error checking: convert to arrays first so the bounds checks are
+    # single vectorized comparisons. (The old list-based versions raised
+    # TypeError because `&` binds tighter than the comparisons, so these
+    # assertions had never actually run.)
+    loci = np.asarray(recombination_loci, dtype=np.int64)
+    probs = np.asarray(recombination_prob, dtype=np.float64)
+    assert loci.size == probs.size
     assert len(person1.genome) == len(person2.genome)
-    assert all(recombination_loci >= 0 & recombination_loci < len(person1.genome))
-    assert all(recombination_prob <= 1 & recombination_prob >= 0)
+    assert np.all((loci >= 0) & (loci < len(person1.genome)))
+    assert np.all((probs >= 0.0) & (probs <= 1.0))
 
     # Initializing
     genome1 = person1.genome
@@ -40,29 +92,26 @@ def recombine(
     # The index of 0 essentially indicates which genome we start with as the template
     # since genome[0:<first_loci>] is essentially the first segment
     # If the index 0 is not in the list of recombination loci, select either genome with equal probability
-    if 0 not in recombination_loci:
-        recombination_loci = [0] + recombination_loci
-        recombination_prob = [0.5] + recombination_prob
+    if not (loci == 0).any():
+        loci = np.concatenate(([0], loci))
+        probs = np.concatenate(([0.5], probs))
     # Adding the last coordinate of the dna to provide an end index
     # for the last segment that can be recombined
-    if len(genome1) not in recombination_loci:
-        recombination_loci = recombination_loci + [len(genome1)]
-        recombination_prob = recombination_prob + [0]
+    if not (loci == len(genome1)).any():
+        loci = np.concatenate((loci, [len(genome1)]))
+        probs = np.concatenate((probs, [0.0]))
 
     ## loci are sorted in ascending order
     ## the probabilities are sorted according to the order of the loci
-    ordered_prob = [prob for _, prob in sorted(zip(recombination_loci, recombination_prob))]
-    ordered_loci = sorted(recombination_loci)
-
-    # Recombining genomes
-    recombination_genome = []
-    for i, loc in enumerate(ordered_loci[:-1]):
-        genome_seg = _choose_one([1, 2], [ordered_prob[i], (1 - ordered_prob[i])])
-        # two adjacent ordered_loci values represent a slice of the genome that will be selected
-        recombination_genome.append(
-            genome1[loc:ordered_loci[(i + 1)]] if genome_seg == 1 else genome2[loc:ordered_loci[(i + 1)]]
-        )
-    recombination_genome = "".join(recombination_genome)
+    order = np.argsort(loci, kind="stable")
+    ordered_loci = loci[order]
+    ordered_prob = probs[order]
+
+    # Recombining genomes: two adjacent ordered_loci values represent a
+    # slice of the genome that will be selected
+    recombination_genome = _recombine_genome(
+        genome1, genome2, ordered_loci, ordered_prob
+    )
 
     # Generate a new person with the recombinant genome
     person_generator = PersonGenerator()
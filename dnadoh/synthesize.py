@@ -3,12 +3,14 @@
 import argparse
 import csv
 import json
+import operator
 import random
 import sys
+from dataclasses import dataclass, fields
 from typing import List, Optional
 
 import util
-from pydantic import BaseModel
+from util import Person
 import numpy as np
 
 # --------------------------------------------------------------------------------------
@@ -24,9 +26,25 @@ DNA = "ACGT"
 # one selected per person with the given probabilities.
 SNP_PROBS = (0.50, 0.25, 0.13, 0.12)
 
+# Byte values of the bases, the code (0-3) for each byte value, and for
+# each base the three alternatives.  These tables let genome generation
+# run on uint8 arrays and only produce strings at the very end.
+BASE_BYTES = np.frombuffer(DNA.encode("ascii"), dtype=np.uint8)
+BASE_CODES = np.zeros(256, dtype=np.uint8)
+BASE_CODES[BASE_BYTES] = np.arange(len(DNA), dtype=np.uint8)
+OTHER_BYTES = np.array(
+    [[c for c in BASE_BYTES if c != b] for b in BASE_BYTES], dtype=np.uint8
+)
 
-class GenePool(BaseModel):
-    """A set of genomes."""
+
+@dataclass(slots=True)
+class GenePool:
+    """A set of genomes.
+
+    A slotted dataclass rather than a pydantic model: these are built in
+    bulk from already-validated generated data, so per-construction
+    validation buys nothing and slots keep instances small.
+    """
 
     # Number of bases in each genome.
     length: int
@@ -34,8 +52,11 @@ class GenePool(BaseModel):
     # Reference genome without mutations.
     reference: str
 
-    # Individual genomes.
-    individuals: List[str]
+    # Individual genomes as one contiguous (num_genomes, length) uint8
+    # matrix: column access (e.g. marker lookup) is a stride-1 slice and
+    # there is a single allocation instead of one str object per person.
+    # Use `genome_str` for the few places that want a Python string.
+    individuals: np.ndarray
 
     # Locations of mutations.
     locations: List[int]
@@ -43,6 +64,17 @@ class GenePool(BaseModel):
     # Family ID
     family_id: Optional[int] = None
 
+    # Per-individual differences from the reference, as (location, base)
+    # pairs sorted by location.  The genomes carry O(people x length)
+    # bytes but only O(people x mutations) information; keeping the
+    # diffs recorded at generation time means consumers that only care
+    # about variants never rescan the dense genomes.
+    variants: Optional[List[List[tuple]]] = None
+
+    def genome_str(self, i):
+        """The i-th individual's genome as a Python string."""
+        return self.individuals[i].tobytes().decode("ascii")
+
     def __str__(self):
         """Printable representation."""
         return "\n".join(
@@ -50,7 +82,9 @@ class GenePool(BaseModel):
                 f"length: {self.length}",
                 f"reference: {self.reference}",
                 "individuals:",
-                "\n".join(f"- {i}" for i in self.individuals),
+                "\n".join(
+                    f"- {self.genome_str(i)}" for i in range(len(self.individuals))
+                ),
                 "locations:",
                 "\n".join(f"- {loc}" for loc in self.locations),
             ]
@@ -60,7 +94,9 @@ class GenePool(BaseModel):
 def random_sequence(length):
     """Generate a random sequence of bases of the specified length."""
     assert 0 < length
-    return "".join(random.choices(DNA, k=length))
+    return BASE_BYTES[np.random.randint(0, len(DNA), size=length)].tobytes().decode(
+        "ascii"
+    )
 
 
 def random_genomes(length, num_genomes, num_snps, max_num_other_mutations):
@@ -74,54 +110,88 @@ def random_genomes(length, num_genomes, num_snps, max_num_other_mutations):
     """
     assert 0 <= num_snps <= length
 
-    # Reference genomes and specific genomes to modify.
+    # The whole population lives in one (num_genomes, length) uint8
+    # matrix: mutations become bulk array assignments instead of
+    # per-person Python work, and strings are only built at the end.
     reference = random_sequence(length)
-    individuals = [reference] * num_genomes
+    ref_arr = np.frombuffer(reference.encode("ascii"), dtype=np.uint8)
+    population = np.tile(ref_arr, (num_genomes, 1))
+
+    # Locations for SNPs. random.sample indexes the range lazily, so
+    # there is no need to materialize `length` ints up front.
+    locations = random.sample(range(length), num_snps)
 
-    # Locations for SNPs.
-    locations = random.sample(list(range(length)), num_snps)
+    # Track every mutation as it is applied (row, location, base) so the
+    # per-person diffs never have to be recovered by rescanning the
+    # dense genomes afterwards.
+    diff_rows, diff_locs, diff_bases = [], [], []
 
-    # Introduce significant mutations.
+    # Introduce significant mutations: per location, everyone draws from
+    # [reference base, shuffled other bases] weighted by SNP_PROBS, as a
+    # single vectorized choice across the population.
     for loc in locations:
-        candidates = _other_bases(reference, loc)
-        bases = [reference[loc]] + random.sample(candidates, k=len(candidates))
-        individuals = [
-            _mutate_significant(reference, ind, loc, bases) for ind in individuals
+        others = OTHER_BYTES[BASE_CODES[ref_arr[loc]]]
+        bases = np.concatenate(([ref_arr[loc]], others[np.random.permutation(3)]))
+        picks = np.random.choice(len(DNA), size=num_genomes, p=SNP_PROBS)
+        # half of all draws keep the reference base, so write only the
+        # rows that actually changed instead of rewriting the column
+        changed = np.flatnonzero(picks != 0)
+        population[changed, loc] = bases[picks[changed]]
+        diff_rows.append(changed)
+        diff_locs.append(np.full(changed.size, loc, dtype=np.int64))
+        diff_bases.append(bases[picks[changed]])
+
+    # Introduce other random mutations: each person mutates a distinct
+    # sample of non-SNP locations to one of the three non-reference
+    # bases, with all the base choices drawn in one call.
+    # a boolean mask instead of set(range(length)) - set(locations): one
+    # bit per position rather than a boxed Python int per position, and
+    # flatnonzero already yields the survivors in sorted order
+    other_mask = np.ones(length, dtype=bool)
+    other_mask[locations] = False
+    other_locations = np.flatnonzero(other_mask)
+    num_other = min(max_num_other_mutations, length)
+    if num_other and other_locations.size:
+        cols = np.array(
+            [
+                random.sample(range(other_locations.size), num_other)
+                for _ in range(num_genomes)
+            ]
+        )
+        mutated = other_locations[cols]
+        alternates = OTHER_BYTES[
+            BASE_CODES[ref_arr[mutated]],
+            np.random.randint(0, 3, size=mutated.shape),
         ]
-
-    # Introduce other random mutations.
-    other_locations = list(set(range(length)) - set(locations))
-    individuals = [
-        _mutate_other(ind, max_num_other_mutations, other_locations)
-        for ind in individuals
-    ]
-
-    # Return structure.
+        rows = np.repeat(np.arange(num_genomes), num_other)
+        population[rows, mutated.ravel()] = alternates.ravel()
+        diff_rows.append(rows)
+        diff_locs.append(mutated.ravel())
+        diff_bases.append(alternates.ravel())
+
+    # Group the recorded mutations into per-person lists sorted by
+    # location (one lexsort over everything).
+    variants = [[] for _ in range(num_genomes)]
+    if diff_rows:
+        all_rows = np.concatenate(diff_rows)
+        all_locs = np.concatenate(diff_locs)
+        all_bases = np.concatenate(diff_bases)
+        order = np.lexsort((all_locs, all_rows))
+        for row, loc, base in zip(
+            all_rows[order].tolist(), all_locs[order].tolist(), all_bases[order].tolist()
+        ):
+            variants[row].append((loc, chr(base)))
+
+    # Return structure; the population matrix is handed over as-is.
     return GenePool(
-        length=length, reference=reference, individuals=individuals, locations=locations
+        length=length,
+        reference=reference,
+        individuals=population,
+        locations=locations,
+        variants=variants,
     )
 
 
-def _mutate_significant(reference, genome, loc, bases):
-    """Introduce mutations at the specified location.
-
-    The base from the reference genome must be first in `bases` and is
-    retained with probability `SNP_PROBS[0]`.  The other bases are
-    selected with the other weights from `SNP_PROBS`.
-    """
-    choice = _choose_one(bases, SNP_PROBS)
-    return genome[:loc] + choice + genome[loc + 1 :]
-
-
-def _mutate_other(genome, max_num_mutations, locations):
-    """Introduce up to `max_num_mutations` at specified locations."""
-    num = min(max_num_mutations, len(genome))
-    for loc in random.sample(locations, k=num):
-        base = random.choice(_other_bases(genome, loc))
-        genome = genome[:loc] + base + genome[loc + 1 :]
-    return genome
-
-
 # --------------------------------------------------------------------------------------
 # People
 # --------------------------------------------------------------------------------------
@@ -130,31 +200,6 @@ def _mutate_other(genome, max_num_mutations, locations):
 PID_WIDTH = 6  # number of digits in PID
 
 
-class Person(BaseModel):
-    """An individual person.
-
-    Values marked `Optional` are filled in one at a time.
-    """
-
-    # Personal identifier.
-    pid: str
-
-    # Genome.
-    genome: str
-
-    # Age in years.
-    age: Optional[int] = None
-
-    # Genetic sex {"F", "M", "O"}.
-    gsex: Optional[str] = None
-
-    # Weight in kg.
-    weight: Optional[float] = None
-
-    # Household ID
-    household_id: Optional[int] = None
-
-
 class PersonGenerator:
     """Generate a person given a set of parameters."""
 
@@ -170,6 +215,14 @@ class PersonGenerator:
     WEIGHT_MEANS = {"F": 80.0, "M": 87.0, "O": 84.0}
     WEIGHT_RSD = 0.12
 
+    # The same values as arrays indexed by gsex code, built once at class
+    # creation so the bulk draws gather them without any dict lookups.
+    GSEX_ARR = np.array(GSEX)
+    # (map rather than a comprehension: class-body comprehensions cannot
+    # see other class attributes)
+    WEIGHT_MEAN_ARR = np.array(list(map(WEIGHT_MEANS.get, GSEX)))
+    WEIGHT_STD_ARR = WEIGHT_MEAN_ARR * WEIGHT_RSD
+
     # Avg household size, per 2021 stats
     # https://www.statista.com/statistics/242189/disitribution-of-households-in-the-us-by-household-size/
     # key = household size, val = proportion of households with number of people indicated by key
@@ -195,6 +248,39 @@ class PersonGenerator:
         self._iter_household()
         return person
 
+    def make_all(self, reference, individuals):
+        """Generate one person per genome, drawing each attribute in bulk.
+
+        Ages, genetic sexes and weights come from three vectorized draws
+        over the whole population instead of per-person RNG calls; only
+        the (stateful) household bookkeeping stays in the loop.
+        """
+        count = len(individuals)
+        ages = np.random.randint(self.MIN_AGE, self.MAX_AGE + 1, size=count)
+        # draw gsex as codes and gather everything else from the
+        # class-level per-gsex arrays
+        codes = np.random.choice(len(self.GSEX), size=count, p=self.GSEX_PROBS)
+        gsexes = self.GSEX_ARR[codes]
+        weights = _truncate_vec(
+            np.random.normal(self.WEIGHT_MEAN_ARR[codes], self.WEIGHT_STD_ARR[codes]), 1
+        )
+        people = []
+        for i, individual in enumerate(individuals):
+            people.append(
+                Person(
+                    pid=self._make_pid(i + 1),
+                    # rows of the pool matrix become per-person strings
+                    # here, exactly once
+                    genome=individual.tobytes().decode("ascii"),
+                    age=int(ages[i]),
+                    gsex=str(gsexes[i]),
+                    weight=float(weights[i]),
+                    household_id=self.hh_id,
+                )
+            )
+            self._iter_household()
+        return people
+
     def make_age(self, person, reference, individual):
         """Generate a random age.
 
@@ -227,19 +313,29 @@ class PersonGenerator:
         return str(i).zfill(PID_WIDTH)
     
     def _random_household_size(self):
-        hh_size = np.random.choice(a = [key for key in self.HOUSEHOLD_SIZE_DISTRIB.keys()], 
-                                size = 1, 
-                                p = [val for val in self.HOUSEHOLD_SIZE_DISTRIB.values()])
-        
+        # locate one uniform draw in the precomputed CDF: the same draw
+        # np.random.choice would make, without rebuilding the size and
+        # probability lists on every call
+        hh_size = int(
+            self._hh_sizes[
+                np.searchsorted(self._hh_cum, np.random.random(), side="right")
+            ]
+        )
+
         if hh_size == 7:
             while np.random.random() < self.HH_SIZE_INCREMENT_PROBABILITY:
                 hh_size += 1
-        
+
         return hh_size
 
     def _init_household(self):
         """Initializes household-related variables"""
 
+        # Household sizes and their cumulative probabilities, computed once
+        self._hh_sizes = np.array(list(self.HOUSEHOLD_SIZE_DISTRIB.keys()))
+        self._hh_cum = np.cumsum(list(self.HOUSEHOLD_SIZE_DISTRIB.values()))
+        self._hh_cum /= self._hh_cum[-1]
+
         # Select a household size weighted by specified probabilities
         self.hh_size =  self._random_household_size()
 
@@ -272,9 +368,12 @@ def adjust_all(genomes, people, func):
         return
     loc = random.choice(genomes.locations)
     candidates = _other_bases(genomes.reference, loc)
-    marker = random.choice(list(candidates))
-    for person in people:
-        if person.genome[loc] == marker:
+    marker = random.choice(candidates)
+    # the pool already holds the genomes as a matrix, so finding the
+    # carriers is one compare over a stride-1 column
+    mask = genomes.individuals[:, loc] == ord(marker)
+    for person, hit in zip(people, mask):
+        if hit:
             func(person)
 
 
@@ -318,12 +417,16 @@ def _write_options(options):
 def _write_overall(options, people):
     """Write DNA sequences and people for reference."""
     filename = util.filename_overall(options.output_stem)
-    headings = people[0].dict().keys()
-    with open(filename, "w") as raw:
-        writer = csv.DictWriter(raw, fieldnames=headings)
-        writer.writeheader()
-        for person in people:
-            writer.writerow(person.dict())
+    # one attrgetter tuple per person through csv.writer: asdict built a
+    # throwaway dict (genome string included) for every row just so
+    # DictWriter could take it apart again; a 1 MiB buffer keeps the
+    # genome-bearing rows from flushing in small pieces
+    headings = [f.name for f in fields(Person)]
+    getter = operator.attrgetter(*headings)
+    with open(filename, "w", buffering=1 << 20) as raw:
+        writer = csv.writer(raw)
+        writer.writerow(headings)
+        writer.writerows(map(getter, people))
 
 
 def _write_reference_genome(options, genomes):
@@ -335,29 +438,59 @@ def _write_reference_genome(options, genomes):
 
 
 def _write_variants(options, genomes, people):
-    """Write one variant file per person."""
-    for person in people:
-        filename = util.filename_person(options.output_stem, person.pid)
-        with open(filename, "w") as raw:
-            writer = csv.DictWriter(raw, fieldnames=["location", "base"])
-            writer.writeheader()
-            for i in range(len(genomes.reference)):
-                if person.genome[i] != genomes.reference[i]:
-                    writer.writerow({"location": i + 1, "base": person.genome[i]})
+    """Write all variants as one long-form CSV keyed by pid.
+
+    A single file replaces the old one-file-per-person layout: for large
+    populations the open/close and filesystem-metadata churn of N tiny
+    files dwarfed the actual data volume.  `assemble` reads this form
+    directly and still understands the per-person layout for old
+    datasets.
+    """
+    filename = util.filename_variants(options.output_stem)
+
+    def rows():
+        if genomes.variants is not None:
+            # the diffs were recorded while the mutations were applied,
+            # so no rescan of the dense genomes is needed at all
+            for person, diffs in zip(people, genomes.variants):
+                for loc, base in diffs:
+                    yield person.pid, loc + 1, base
+        else:
+            # pools built without tracking: one vectorized compare
+            # against the reference finds each person's mismatches
+            ref_arr = np.frombuffer(genomes.reference.encode("ascii"), dtype=np.uint8)
+            for person in people:
+                person_arr = np.frombuffer(
+                    person.genome.encode("ascii"), dtype=np.uint8
+                )
+                mismatches = np.flatnonzero(person_arr != ref_arr)
+                for loc, base in zip(mismatches, person_arr[mismatches]):
+                    yield person.pid, int(loc) + 1, chr(base)
+
+    # positional tuples through csv.writer: DictWriter re-maps every row
+    # dict onto the field list, which is pure overhead for a fixed
+    # three-column schema
+    with open(filename, "w", buffering=1 << 20) as raw:
+        writer = csv.writer(raw)
+        writer.writerow(("pid", "location", "base"))
+        writer.writerows(rows())
 
 
 def _write_phenotypes(options, people):
     """Write phenotypic data for people."""
+    # imported here so plain genome generation never pays the pandas
+    # start-up cost; this is the only place synthesize needs it
+    import pandas as pd
+
     filename = util.filename_phenotypes(options.output_stem)
-    headings = people[0].dict()
-    del headings["genome"]
-    with open(filename, "w") as raw:
-        writer = csv.DictWriter(raw, fieldnames=headings)
-        writer.writeheader()
-        for person in people:
-            details = person.dict()
-            del details["genome"]
-            writer.writerow(details)
+    # column-at-a-time attribute reads feed one to_csv call, which
+    # formats and writes every row in C; the lineterminator matches what
+    # the csv module wrote so existing datasets stay byte-identical
+    headings = [f.name for f in fields(Person) if f.name != "genome"]
+    frame = pd.DataFrame(
+        {name: [getattr(person, name) for person in people] for name in headings}
+    )
+    frame.to_csv(filename, index=False, lineterminator="\r\n")
 
 
 # --------------------------------------------------------------------------------------
@@ -370,21 +503,44 @@ def _choose_one(values, weights):
     return random.choices(values, weights=weights, k=1)[0]
 
 
+# The three alternatives to each base, baked once at module load so the
+# callers never rebuild a set; tuples stay indexable for random.choice().
+_OTHER = {base: tuple(x for x in DNA if x != base) for base in DNA}
+
+
 def _other_bases(seq, loc):
-    """Create a list of bases minus the one in the sequence at that location.
+    """The bases other than the one in the sequence at that location.
 
-    We return a list instead of a set because the result is used in random.choices(),
-    which requires an indexable sequence.
+    Returns an indexable sequence (for random.choices()); accepts both
+    strings and byte sequences.
     """
-    return list(set(DNA) - {seq[loc]})
+    base = seq[loc]
+    if not isinstance(base, str):
+        base = chr(base)
+    return _OTHER[base]
+
+
+# Powers of ten for the truncation helpers, computed once rather than
+# via a generic int pow on every call.
+_SCALES = tuple(10**d for d in range(8))
 
 
 def _truncate(num, digits):
     """Truncate a number to the specified number of fractional digits."""
-    scale = 10**digits
+    scale = _SCALES[digits]
     return int(scale * num) / scale
 
 
+def _truncate_vec(arr, digits):
+    """Truncate an array to the specified number of fractional digits.
+
+    One C-level pass over the whole array rather than a Python-level
+    `_truncate` call per element.
+    """
+    scale = _SCALES[digits]
+    return np.trunc(arr * scale) / scale
+
+
 # --------------------------------------------------------------------------------------
 # Main driver
 # --------------------------------------------------------------------------------------
@@ -455,7 +611,7 @@ def generate(options):
         options.max_num_other_mutations,
     )
     pg = PersonGenerator(options)
-    people = [pg.make(genomes.reference, ind, i + 1) for (i, ind) in enumerate(genomes.individuals)]
+    people = pg.make_all(genomes.reference, genomes.individuals)
     adjust_all(genomes, people, adjust_weight)
     return genomes, people
 
@@ -1,21 +1,21 @@
 """Utilities."""
 
-from typing import List, Optional
-
-from pydantic import BaseModel
+from dataclasses import dataclass
+from typing import Optional
 
 # Number of digits to use in person filenames.
 WIDTH = 6
 
 
-class Person(BaseModel):
+@dataclass(slots=True)
+class Person:
     """An individual person.
 
     Values marked `Optional` are filled in one at a time.
     """
 
-    # Person ID.
-    pid: int
+    # Personal identifier.
+    pid: str
 
     # Genome.
     genome: str
@@ -29,6 +29,9 @@ class Person(BaseModel):
     # Weight in kg.
     weight: Optional[float] = None
 
+    # Household ID
+    household_id: Optional[int] = None
+
 
 def filename_overall(stem):
     """Where to store overall summary."""
@@ -46,6 +49,11 @@ def filename_person(stem, pid):
     return f"{stem}-pid{pid_str}.csv"
 
 
+def filename_variants(stem):
+    """Where to store the long-form variant data for all people."""
+    return f"{stem}-variants.csv"
+
+
 def filename_phenotypes(stem):
     """Where to store phenotypic data for all people."""
     return f"{stem}-phenotypes.csv"
@@ -61,6 +69,11 @@ def filename_assembled_data(stem):
     return f"{stem}-assembled.csv"
 
 
+def filename_assembled_parquet(stem):
+    """Where to store the assembled data in its columnar (Parquet) form."""
+    return f"{stem}-assembled.parquet"
+
+
 def pid_width(length):
     """Number of digits in personal information files' names."""
     return max(2, len(str(length)))